@@ -1,25 +1,38 @@
 from flask import Flask, request, render_template, Response
 from twilio.rest import Client
 from twilio.twiml.messaging_response import MessagingResponse
-import os, json, requests
-from io import BytesIO
+import os, json, queue, requests, asyncio, threading, tempfile, hashlib
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import gspread
 from google.oauth2.service_account import Credentials
 
 # File parsing
-import PyPDF2
+import fitz  # PyMuPDF
 import docx
+try:
+    import docx2txt  # faster ZIP+XML pass than building a docx.Document
+except ImportError:
+    docx2txt = None
 try:
     import pytesseract
     from PIL import Image
 except:
     pytesseract = None
+try:
+    import aiopytesseract
+except ImportError:
+    aiopytesseract = None
 
 # Gemini client
 from google import genai
+from pydantic import BaseModel
 from requests.auth import HTTPBasicAuth
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+from fast_extract import extract_details_fast
+
 # ===== Load Environment Variables =====
 load_dotenv()
 ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
@@ -30,6 +43,31 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 # Gemini Client
 gemini_client = genai.Client(api_key=GEMINI_API_KEY)
+GEMINI_MODEL = "gemini-2.5-flash"
+PROMPT_PREAMBLE = (
+    "Extract all people’s details (Name, Email, Phone) from this text.\n"
+    "Use an empty string for any detail that is missing.\n\n"
+)
+TEXT_HEADER = "Text:\n"
+# No Gemini prompt caching: the ~40-token prefix is far below the 1024-token
+# minimum that both explicit and implicit caching need on gemini-2.5-flash
+PROMPT_PREFIX = PROMPT_PREAMBLE + TEXT_HEADER
+
+class Person(BaseModel):
+    Name: str = ""
+    Email: str = ""
+    Phone: str = ""
+
+# Recent Gemini results keyed by SHA-256 of the input text (LRU)
+DETAILS_CACHE_SIZE = 512
+details_cache = OrderedDict()
+details_cache_lock = threading.Lock()
+
+# Structured output: Gemini returns JSON matching list[Person]
+GEMINI_OUTPUT_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": list[Person],
+}
 
 # Google Sheets using credentials file
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets",
@@ -41,111 +79,276 @@ sheet = gc.open("candidatedata").sheet1
 # Twilio Client
 client = Client(ACCOUNT_SID, AUTH_TOKEN)
 
+# Keep-alive session for media downloads (reuses TLS connections)
+twilio_http = requests.Session()
+twilio_http.auth = HTTPBasicAuth(ACCOUNT_SID, AUTH_TOKEN)
+twilio_http.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
+# Background workers so the Twilio webhook returns immediately
+executor = ThreadPoolExecutor(max_workers=8)
+
 # Flask App
 app = Flask(__name__)
-received_messages = []  # store messages in memory for UI
+received_messages = deque(maxlen=1000)  # latest messages kept in memory for UI
+subscribers = []  # one queue per open /stream connection
+messages_lock = threading.Lock()  # guards received_messages and subscribers
+SSE_KEEPALIVE = 15  # seconds between keep-alive comments
+# Each /stream connection holds a server thread for as long as it is open;
+# keep this well below `threads` in gunicorn.conf.py so webhooks always get one
+MAX_SSE_CLIENTS = 32
+
+# OCR tuning
+OCR_MIN_CHARS_PER_PAGE = 20  # below this a PDF page is treated as a scan
+OCR_MAX_IMAGE_SIDE = 2000    # downscale larger images before Tesseract
+OCR_PDF_DPI = 200
+# LSTM engine only, English only, single uniform block of text
+TESSERACT_LANG = "eng"
+TESSERACT_OEM = 1
+TESSERACT_PSM = 6
+# Cap OpenMP threads per Tesseract process (read when Tesseract starts)
+os.environ.setdefault("OMP_THREAD_LIMIT", "4")
+try:
+    TESSERACT_THREADS = max(1, int(os.environ["OMP_THREAD_LIMIT"]))
+except ValueError:
+    # OpenMP ignores a bad value and uses every core
+    TESSERACT_THREADS = os.cpu_count() or 1
+
+# Media downloads spill to disk above this size instead of staying in memory
+MEDIA_SPOOL_MAX = 2 * 1024 * 1024
+MEDIA_CHUNK_SIZE = 64 * 1024
 
 # ===== Helper Functions =====
+def ocr_image(img, dpi=None):
+    """Run Tesseract on a PIL image, downscaling very large inputs first."""
+    img.thumbnail((OCR_MAX_IMAGE_SIDE, OCR_MAX_IMAGE_SIDE))
+    config = f"--oem {TESSERACT_OEM} --psm {TESSERACT_PSM}"
+    if dpi:
+        config += f" --dpi {dpi}"
+    return pytesseract.image_to_string(img, lang=TESSERACT_LANG, config=config)
+
+def page_dpi(page):
+    """Render DPI for a PDF page, lowered so no side exceeds OCR_MAX_IMAGE_SIDE."""
+    longest_inches = max(page.rect.width, page.rect.height) / 72
+    return max(1, min(OCR_PDF_DPI, int(OCR_MAX_IMAGE_SIDE / longest_inches)))
+
+async def ocr_pages(pages):
+    """OCR (PNG bytes, dpi) page images concurrently without oversubscribing CPU cores."""
+    sem = asyncio.Semaphore(max(1, (os.cpu_count() or 1) // TESSERACT_THREADS))
+
+    async def ocr_one(png, dpi):
+        async with sem:
+            return await aiopytesseract.image_to_string(
+                png, dpi=dpi, lang=TESSERACT_LANG, oem=TESSERACT_OEM, psm=TESSERACT_PSM
+            )
+
+    return await asyncio.gather(*(ocr_one(png, dpi) for png, dpi in pages))
+
+def ocr_pdf(doc):
+    """OCR every page of a scanned PDF by rasterizing it."""
+    # Both paths get the same image size and DPI for a given page
+    if aiopytesseract:
+        pages = []
+        for page in doc:
+            dpi = page_dpi(page)
+            pages.append((page.get_pixmap(dpi=dpi).tobytes("png"), dpi))
+        return "\n".join(asyncio.run(ocr_pages(pages)))
+
+    texts = []
+    for page in doc:
+        dpi = page_dpi(page)
+        pix = page.get_pixmap(dpi=dpi)
+        img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        texts.append(ocr_image(img, dpi))
+    return "\n".join(texts)
+
+def download_media(media_url):
+    """Stream a Twilio media file into a spooled temp file, rewound for reading."""
+    buf = tempfile.SpooledTemporaryFile(max_size=MEDIA_SPOOL_MAX)
+    with twilio_http.get(media_url, stream=True, timeout=10) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(MEDIA_CHUNK_SIZE):
+            buf.write(chunk)
+    buf.seek(0)
+    return buf
+
 def extract_text_from_file(media_url, media_type):
     try:
-        response = requests.get(media_url, auth=HTTPBasicAuth(ACCOUNT_SID, AUTH_TOKEN))
-        if 'pdf' in media_type.lower():
-            pdf_reader = PyPDF2.PdfReader(BytesIO(response.content))
-            text = ""
-            for page in pdf_reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-            return text
-        elif 'word' in media_type.lower():
-            doc = docx.Document(BytesIO(response.content))
-            return "\n".join([p.text for p in doc.paragraphs])
-        elif media_type.startswith("image/") and pytesseract:
-            img = Image.open(BytesIO(response.content))
-            return pytesseract.image_to_string(img)
-        else:
-            return ""
+        with download_media(media_url) as buf:
+            return parse_media(buf, media_type)
     except Exception as e:
         print("❌ File parse error:", e)
         return ""
 
+def parse_media(buf, media_type):
+    """Extract text from a downloaded media file based on its content type."""
+    if 'pdf' in media_type.lower():
+        # PyMuPDF only opens in-memory streams from bytes
+        with fitz.open(stream=buf.read(), filetype="pdf") as doc:
+            text = "\n".join(page.get_text() for page in doc)
+            # Only pay for OCR when the PDF has no usable text layer
+            if len(text.strip()) < OCR_MIN_CHARS_PER_PAGE * doc.page_count and pytesseract:
+                try:
+                    text = ocr_pdf(doc)
+                except Exception as e:
+                    # Keep whatever the text layer gave us
+                    print("❌ OCR error:", e)
+            return text
+    elif 'word' in media_type.lower():
+        if docx2txt:
+            return docx2txt.process(buf)
+        doc = docx.Document(buf)
+        return "\n".join(p.text for p in doc.paragraphs)
+    elif media_type.startswith("image/") and pytesseract:
+        img = Image.open(buf)
+        return ocr_image(img)
+    else:
+        return ""
+
+def ask_gemini(text):
+    """Extract people details from text with a Gemini call."""
+    response = gemini_client.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=PROMPT_PREFIX + text,
+        config=GEMINI_OUTPUT_CONFIG
+    )
+
+    cleaned = []
+    for p in response.parsed:
+        cleaned.append({
+            "Name": p.Name.strip(),
+            "Email": p.Email.strip(),
+            "Phone": p.Phone.strip()
+        })
+    return cleaned
+
 def extract_details(text):
     """Extract multiple people details using Gemini."""
-    prompt = (
-        "Extract all people’s details (Name, Email, Phone) from this text.\n"
-        "Return strictly as a JSON array like:\n"
-        "[{\"Name\":\"...\", \"Email\":\"...\", \"Phone\":\"...\"}]\n\n"
-        f"Text:\n{text}"
-    )
+    # Re-sent resumes and Twilio retries skip the Gemini call
+    key = hashlib.sha256(text.encode()).hexdigest()
+    with details_cache_lock:
+        if key in details_cache:
+            details_cache.move_to_end(key)
+            return [dict(p) for p in details_cache[key]]
+
     try:
-        response = gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
-        data = response.text.strip()
-        start = data.find("[")
-        end = data.rfind("]") + 1
-        details_list = json.loads(data[start:end].replace("'", '"'))
-        
-        cleaned = []
-        for d in details_list:
-            cleaned.append({
-                "Name": d.get("Name","").strip(),
-                "Email": d.get("Email","").strip(),
-                "Phone": d.get("Phone","").strip()
-            })
-        return cleaned
+        cleaned = ask_gemini(text)
     except Exception as e:
         print("Gemini parsing error:", e)
         return [{"Name": "", "Email": "", "Phone": ""}]
 
-# ===== Flask Routes =====
-@app.route("/incoming", methods=["POST"])
-def incoming_message():
-    from_number = request.form.get("From")
-    message_body = request.form.get("Body") or ""
-    num_media = int(request.form.get("NumMedia", 0))
+    with details_cache_lock:
+        details_cache[key] = cleaned
+        if len(details_cache) > DETAILS_CACHE_SIZE:
+            details_cache.popitem(last=False)
+    return [dict(p) for p in cleaned]
+
+def process_message(form):
+    """Parse, extract and store one incoming message, then reply on WhatsApp."""
+    from_number = form.get("From")
+    message_body = form.get("Body") or ""
+    num_media = int(form.get("NumMedia", 0))
 
     if num_media > 0:
-        media_url = request.form.get("MediaUrl0")
-        media_type = request.form.get("MediaContentType0")
+        media_url = form.get("MediaUrl0")
+        media_type = form.get("MediaContentType0")
         message_body = extract_text_from_file(media_url, media_type)
 
-    people = extract_details(message_body)
+    # Nothing to extract: skip the Gemini round-trip entirely
+    if not message_body.strip():
+        people = []
+    else:
+        # Regex shortcut only for typed messages, never for file text
+        people = extract_details_fast(message_body) if num_media == 0 else None
+        if people is None:
+            people = extract_details(message_body)
 
+    rows = []
     for person in people:
         name = person.get("Name","")
         email = person.get("Email","")
-        phone = person.get("Phone","")
-        if not phone:
-            phone = ""
+        phone = person.get("Phone","") or ""
         if name or email or phone:
-            try:
-                sheet.append_row([name,email,phone])
-            except:
-                pass
-            received_messages.append({"Name":name, "Email":email, "Phone":phone})
+            rows.append([name, email, phone])
+
+    stored = False
+    if rows:
+        # One Sheets API call for the whole batch instead of one per row
+        try:
+            sheet.append_rows(rows, value_input_option="RAW", insert_data_option="INSERT_ROWS")
+            stored = True
+        except Exception as e:
+            print("❌ Sheet write error:", e)
+
+    if stored:
+        new_rows = [dict(zip(("Name", "Email", "Phone"), row)) for row in rows]
+        payload = json.dumps(new_rows)
+        with messages_lock:
+            received_messages.extend(new_rows)
+            for q in subscribers:
+                q.put_nowait(payload)
+
+    if not message_body.strip():
+        reply = "⚠️ No text found in your message."
+    elif stored:
+        reply = f"✅ {len(rows)} candidate(s) details stored successfully."
+    elif rows:
+        reply = "❌ Could not save the candidate details, please try again."
+    else:
+        reply = "⚠️ No candidate details found in your message."
+    try:
+        client.messages.create(from_=TWILIO_WHATSAPP, to=from_number, body=reply)
+    except Exception as e:
+        print("❌ Twilio reply error:", e)
+
+def log_task_error(future):
+    if future.exception():
+        print("❌ Message processing error:", future.exception())
+
+# ===== Flask Routes =====
+@app.route("/incoming", methods=["POST"])
+def incoming_message():
+    # Copy the form: the request context is gone once we return
+    future = executor.submit(process_message, request.form.to_dict())
+    future.add_done_callback(log_task_error)
 
     resp = MessagingResponse()
-    resp.message(f"✅ {len(people)} candidate(s) details stored successfully.")
+    resp.message("⏳ Received, processing your message…")
     return str(resp)
 
 # ===== SSE for dynamic UI =====
 @app.route("/stream")
 def stream():
+    q = queue.Queue()
+    # Subscribe and snapshot together so no row is missed or sent twice
+    with messages_lock:
+        if len(subscribers) >= MAX_SSE_CLIENTS:
+            return Response("Too many dashboard connections", status=503)
+        subscribers.append(q)
+        snapshot = json.dumps(list(received_messages))
+
+    def unsubscribe():
+        with messages_lock:
+            subscribers.remove(q)
+
     def event_stream():
-        last_len = 0
+        yield f"event: snapshot\ndata: {snapshot}\n\n"
         while True:
-            if len(received_messages) > last_len:
-                new_data = received_messages[last_len:]
-                last_len = len(received_messages)
-                yield f"data: {json.dumps(new_data)}\n\n"
-    return Response(event_stream(), mimetype="text/event-stream")
+            try:
+                yield f"data: {q.get(timeout=SSE_KEEPALIVE)}\n\n"
+            except queue.Empty:
+                # Lets the server notice clients that went away
+                yield ": keep-alive\n\n"
+
+    response = Response(event_stream(), mimetype="text/event-stream")
+    # Runs on disconnect even if the stream never started
+    response.call_on_close(unsubscribe)
+    return response
 
 @app.route("/")
 def index():
     return render_template("index.html")
 
 # ===== Run Flask =====
+# Production: `gunicorn app:app` (settings in gunicorn.conf.py)
 if __name__ == "__main__":
-    app.run(port=5000, debug=True)
+    app.run(port=5000, threaded=True)
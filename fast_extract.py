@@ -0,0 +1,49 @@
+"""Regex fast path for short single-person WhatsApp messages.
+
+Kept free of the app's Flask/Twilio/Gemini setup so it can be tested alone.
+"""
+import re
+
+FAST_PATH_MAX_LEN = 500
+# Domain labels end on a word character, so a trailing full stop isn't kept
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE_RE = re.compile(r"(?:\+?\d[\s-]?){10,15}")
+NAME_RE = re.compile(r"[A-Za-z][A-Za-z.'-]*(?: [A-Za-z][A-Za-z.'-]*){0,2}")  # 1-3 words
+FAST_PATH_SEPARATORS = " \t\r\n,;:|-."
+
+
+def extract_details_fast(text):
+    """Handle "Name email phone" messages without Gemini; None if unsure.
+
+    The name must lead, be followed only by one email and one phone, and
+    share a word with the email's local part (john.doe@... for "John Doe").
+    Anything else is left to Gemini.
+    """
+    if len(text) >= FAST_PATH_MAX_LEN:
+        return None
+    emails = list(EMAIL_RE.finditer(text))
+    if len(emails) != 1:
+        return None
+    # Blank out the email (keeping offsets) so digits inside it aren't a phone
+    def blank(m):
+        return " " * len(m.group())
+    without_email = EMAIL_RE.sub(blank, text)
+    phones = list(PHONE_RE.finditer(without_email))
+    if len(phones) != 1:
+        return None
+
+    # The name must lead, followed only by the email and phone
+    first = min(emails[0].start(), phones[0].start())
+    tail = PHONE_RE.sub(blank, without_email)[first:]
+    if tail.strip(FAST_PATH_SEPARATORS):
+        return None
+    name = " ".join(text[:first].split()).strip(FAST_PATH_SEPARATORS)
+    if not NAME_RE.fullmatch(name):
+        return None
+
+    email = emails[0].group()
+    local_part = re.sub(r"[^a-z]", "", email.split("@")[0].lower())
+    words = [re.sub(r"[^a-z]", "", w.lower()) for w in name.split()]
+    if not any(len(w) >= 2 and w in local_part for w in words):
+        return None
+    return [{"Name": name, "Email": email, "Phone": phones[0].group().strip()}]
@@ -0,0 +1,11 @@
+# Gunicorn settings, loaded automatically by `gunicorn app:app`.
+#
+# Messages, SSE subscribers and the background executor live in process
+# memory, so run a single worker and scale with threads: with more workers
+# a dashboard tab would only see messages handled by its own process.
+bind = "0.0.0.0:5000"
+worker_class = "gthread"
+workers = 1
+# Each open /stream connection holds one thread until the tab closes, so
+# leave plenty above MAX_SSE_CLIENTS (app.py) for /incoming webhooks
+threads = 64
@@ -0,0 +1,55 @@
+import unittest
+
+from fast_extract import extract_details_fast
+
+
+class ExtractDetailsFastTest(unittest.TestCase):
+    def assertPerson(self, text, name, email, phone):
+        self.assertEqual(
+            extract_details_fast(text),
+            [{"Name": name, "Email": email, "Phone": phone}],
+        )
+
+    def test_accepts_name_email_phone(self):
+        self.assertPerson("John Doe john@x.com 9876543210", "John Doe", "john@x.com", "9876543210")
+
+    def test_accepts_separators_and_formatted_phone(self):
+        self.assertPerson(
+            "John Doe, john.doe@x.com, +91 98765-43210", "John Doe", "john.doe@x.com", "+91 98765-43210"
+        )
+
+    def test_accepts_phone_before_email_on_separate_lines(self):
+        self.assertPerson("Ravi Kumar\n9876543210\nravi.k@x.co.in", "Ravi Kumar", "ravi.k@x.co.in", "9876543210")
+
+    def test_drops_trailing_full_stop_from_email(self):
+        self.assertPerson("John Doe 9876543210 john@x.com.", "John Doe", "john@x.com", "9876543210")
+
+    def test_rejects_leading_phrases(self):
+        for text in [
+            "Please add ravi@x.com 9876543210",
+            "Contact ravi@x.com 9876543210",
+            "Thanks john@x.com 9876543210",
+            "Senior Developer john@x.com 9876543210",
+            "I am John Doe john@x.com 9876543210",
+        ]:
+            with self.subTest(text=text):
+                self.assertIsNone(extract_details_fast(text))
+
+    def test_rejects_name_not_leading(self):
+        self.assertIsNone(extract_details_fast("Call me on 9876543210 mail ravi@x.com"))
+        self.assertIsNone(extract_details_fast("John Doe john@x.com 9876543210 thanks"))
+
+    def test_ignores_digits_inside_email(self):
+        self.assertIsNone(extract_details_fast("john9876543210@x.com Ravi Kumar"))
+
+    def test_rejects_multiple_or_missing_contacts(self):
+        self.assertIsNone(extract_details_fast("a@b.com 9876543210 c@d.com"))
+        self.assertIsNone(extract_details_fast("John Doe john@x.com"))
+        self.assertIsNone(extract_details_fast("john@x.com 9876543210"))
+
+    def test_rejects_long_text(self):
+        self.assertIsNone(extract_details_fast("John Doe john@x.com 9876543210" + " " * 500))
+
+
+if __name__ == "__main__":
+    unittest.main()